@@ -1,5 +1,6 @@
 import os
 
+import click
 from flask import Flask, jsonify
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
@@ -42,8 +43,14 @@ migrate.init_app(app, db)
 
 from . import models
 from .views import bp
+from .ratelimit import limiter
+from .compression import compressor
+from .stats import stats_cache
 
 app.register_blueprint(bp)
+limiter.init_app(app)
+compressor.init_app(app)
+stats_cache.init_app(app)
 
 
 @app.cli.command("seed")
@@ -51,3 +58,51 @@ def seed_command():
     from .seed import run_seed
 
     run_seed(reset=True)
+
+
+@app.cli.command("import-records")
+@click.argument("file", type=click.Path(exists=True, dir_okay=False))
+@click.option("--errors", "errors_path", default="import_errors.csv", show_default=True,
+              help="CSV file that receives rejected rows.")
+@click.option("--batch-size", default=5000, show_default=True, type=click.IntRange(min=1))
+def import_records_command(file, errors_path, batch_size):
+    from .importer import run_import
+
+    with open(file, newline="", encoding="utf-8") as source, \
+            open(errors_path, "w", newline="", encoding="utf-8") as errors:
+        try:
+            inserted, rejected = run_import(source, errors, batch_size=batch_size)
+        except ValueError as e:
+            raise click.ClickException(str(e))
+
+    click.echo(f"imported {inserted} records, rejected {rejected} (see {errors_path})")
+
+
+@app.cli.command("bench-compression")
+@click.option("--sizes", default="10,100,1000,10000", show_default=True)
+@click.option("--levels", default="1,6,9", show_default=True)
+def bench_compression_command(sizes, levels):
+    from .compression import run_benchmark
+
+    sizes = [int(s) for s in sizes.split(",")]
+    levels = [int(level) for level in levels.split(",")]
+
+    click.echo(f"{'items':>6} {'shape':<12} {'codec':<9} {'level':>5} {'bytes':>10} {'us/resp':>10}")
+    for size, shape, codec, level, nbytes, micros in run_benchmark(sizes, levels):
+        click.echo(f"{size:>6} {shape:<12} {codec:<9} {level:>5} {nbytes:>10} {micros:>10.1f}")
+
+
+@app.cli.command("stress-writes")
+@click.option("--threads", default=8, show_default=True, type=click.IntRange(min=2))
+@click.option("--rounds", default=20, show_default=True, type=click.IntRange(min=2),
+              help="Distinct users to contend for; every thread writes each one.")
+@click.option("--keep", is_flag=True, help="Keep the rows created by the run.")
+def stress_writes_command(threads, rounds, keep):
+    from .stress import run_stress
+
+    report, failures = run_stress(threads=threads, rounds=rounds, keep=keep)
+    for line in report:
+        click.echo(line)
+    if failures:
+        raise click.ClickException("\n".join(failures))
+    click.echo("OK: no duplicates, no 5xx, expected 404/409 mix")
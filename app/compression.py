@@ -0,0 +1,106 @@
+import gzip
+import json
+import time
+import zlib
+from datetime import datetime, timedelta, timezone
+
+from flask import request
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+def _compressors(level):
+    codecs = {
+        "gzip": lambda data: gzip.compress(data, compresslevel=level, mtime=0),
+        "deflate": lambda data: zlib.compress(data, level),
+    }
+    if brotli is not None:
+        codecs["br"] = lambda data: brotli.compress(data, quality=min(level, 11))
+    return codecs
+
+
+class Compressor:
+    def __init__(self):
+        self.min_size = 0
+        self.mimetypes = set()
+        self.codecs = {}
+
+    def init_app(self, app):
+        app.json.compact = app.config.get("JSON_COMPACT", True)
+
+        self.min_size = app.config.get("COMPRESS_MIN_SIZE", 1024)
+        self.mimetypes = set(app.config.get("COMPRESS_MIMETYPES", ("application/json",)))
+        self.codecs = _compressors(app.config.get("COMPRESS_LEVEL", 6))
+
+        app.after_request(self._after_request)
+
+    def _after_request(self, response):
+        if (
+            response.direct_passthrough
+            or not 200 <= response.status_code < 300
+            or response.status_code == 204
+            or "Content-Encoding" in response.headers
+            or response.mimetype not in self.mimetypes
+        ):
+            return response
+
+        response.vary.add("Accept-Encoding")
+        data = response.get_data()
+        if len(data) < self.min_size:
+            return response
+
+        encoding = request.accept_encodings.best_match(list(self.codecs))
+        if encoding is None:
+            return response
+
+        response.set_data(self.codecs[encoding](data))
+        response.headers["Content-Encoding"] = encoding
+        return response
+
+
+compressor = Compressor()
+
+
+def _sample_records(count):
+    start = datetime(2025, 10, 1, tzinfo=timezone.utc)
+    return [
+        {
+            "id": i,
+            "user_id": i % 50 + 1,
+            "category_id": i % 12 + 1,
+            "datetime": (start + timedelta(minutes=17 * i)).isoformat(),
+            "amount": round(i * 3.17 % 1000, 2),
+        }
+        for i in range(1, count + 1)
+    ]
+
+
+def run_benchmark(sizes, levels, repeat: int = 20):
+    """Yield (size, shape, codec, level, bytes, microseconds per encode) rows."""
+    for size in sizes:
+        items = _sample_records(size)
+        shapes = {
+            "rows-pretty": lambda: json.dumps({"items": items, "count": size}, indent=2),
+            "rows": lambda: json.dumps({"items": items, "count": size}, separators=(",", ":")),
+            "columnar": lambda: json.dumps(
+                {"items": {k: [r[k] for r in items] for k in items[0]}, "count": size},
+                separators=(",", ":"),
+            ),
+        }
+        for shape, encode in shapes.items():
+            started = time.perf_counter()
+            for _ in range(repeat):
+                body = encode().encode()
+            encode_us = (time.perf_counter() - started) / repeat * 1e6
+            yield size, shape, "identity", "-", len(body), encode_us
+
+            for level in levels:
+                for codec, compress in _compressors(level).items():
+                    started = time.perf_counter()
+                    for _ in range(repeat):
+                        compressed = compress(body)
+                    compress_us = (time.perf_counter() - started) / repeat * 1e6
+                    yield size, shape, codec, level, len(compressed), encode_us + compress_us
@@ -15,6 +15,35 @@ else:
 SQLALCHEMY_DATABASE_URI = uri
 SQLALCHEMY_TRACK_MODIFICATIONS = False
 
+RATELIMIT_STORAGE = os.getenv("RATELIMIT_STORAGE", "sqlite:////tmp/ratelimit.db")
+RATE_LIMITS = {
+    "api.login": os.getenv("RATE_LIMIT_LOGIN", "10/minute"),
+    "api.register_user": os.getenv("RATE_LIMIT_REGISTER", "10/minute"),
+    "api.add_record_data": os.getenv("RATE_LIMIT_ADD_RECORD", "20/second"),
+    "api.add_category": os.getenv("RATE_LIMIT_ADD_CATEGORY", "5/second"),
+}
+# Counted across all workers; keep it below workers * GUNICORN_THREADS so the
+# cap is reached before requests start queueing inside gunicorn.
+MAX_CONCURRENT_REQUESTS = int(os.getenv("MAX_CONCURRENT_REQUESTS", "12"))
+CONCURRENCY_STALE_AFTER = int(os.getenv("CONCURRENCY_STALE_AFTER", "60"))
+CONCURRENCY_EXEMPT = ("api.healthcheck",)
+
+IDEMPOTENCY_TTL = int(os.getenv("IDEMPOTENCY_TTL", "86400"))
+# How long a retry waits for an unfinished request before taking its key over.
+# A request that is still running then loses the key and its write is rolled
+# back, so a too-short lease costs a 409, never a duplicate.
+IDEMPOTENCY_LEASE = int(os.getenv("IDEMPOTENCY_LEASE", "60"))
+
+JSON_COMPACT = True
+COMPRESS_MIN_SIZE = int(os.getenv("COMPRESS_MIN_SIZE", "1024"))
+COMPRESS_LEVEL = int(os.getenv("COMPRESS_LEVEL", "6"))
+COMPRESS_MIMETYPES = ("application/json",)
+
+STATS_CACHE_SIZE = int(os.getenv("STATS_CACHE_SIZE", "1024"))
+STATS_CACHE_TTL = int(os.getenv("STATS_CACHE_TTL", "30"))
+STATS_CACHE_STORAGE = os.getenv("STATS_CACHE_STORAGE", "sqlite:////tmp/stats_cache.db")
+STATS_TOP_CATEGORIES = 5
+
 API_TITLE = "Finance REST API"
 API_VERSION = "v1"
 
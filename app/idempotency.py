@@ -0,0 +1,169 @@
+from datetime import datetime, timedelta, timezone
+from functools import wraps
+from hashlib import sha256
+
+from flask import current_app, g, jsonify, make_response, request
+from flask_jwt_extended import get_jwt_identity
+from sqlalchemy import delete, update
+from sqlalchemy.exc import IntegrityError
+
+from . import db
+from .models import IdempotencyKey
+
+
+HEADER = "Idempotency-Key"
+
+
+def _error(message, status, **headers):
+    response = jsonify({"error": message})
+    response.status_code = status
+    response.headers.update(headers)
+    return response
+
+
+def _replay(entry):
+    response = current_app.response_class(entry.body, status=entry.status, mimetype="application/json")
+    response.headers["Idempotent-Replayed"] = "true"
+    return response
+
+
+def _placeholder(scope, lease_start):
+    """Conditions matching the placeholder only while this request holds its lease."""
+    identity, endpoint, key = scope
+    return (
+        IdempotencyKey.identity == identity,
+        IdempotencyKey.endpoint == endpoint,
+        IdempotencyKey.key == key,
+        IdempotencyKey.status.is_(None),
+        IdempotencyKey.created_at == lease_start,
+    )
+
+
+def _take_over(scope, now, lease):
+    """Claim a placeholder whose owner has not finished within the lease."""
+    identity, endpoint, key = scope
+    result = db.session.execute(
+        update(IdempotencyKey)
+        .where(
+            IdempotencyKey.identity == identity,
+            IdempotencyKey.endpoint == endpoint,
+            IdempotencyKey.key == key,
+            IdempotencyKey.status.is_(None),
+            IdempotencyKey.created_at < now - lease,
+        )
+        .values(created_at=now)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    return result.rowcount == 1
+
+
+def _release(scope, lease_start):
+    db.session.rollback()
+    db.session.execute(
+        delete(IdempotencyKey)
+        .where(*_placeholder(scope, lease_start))
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+
+
+def commit(after=None):
+    """Commit a view's write; ``after`` runs once it is committed.
+
+    Inside ``idempotent`` the write is only flushed: the wrapper commits it
+    together with the stored response, so a placeholder without a response
+    always means nothing was written.
+    """
+    pending = g.get("idempotency_pending")
+    if pending is None:
+        db.session.commit()
+        if after is not None:
+            after()
+        return
+    db.session.flush()
+    if after is not None:
+        pending.append(after)
+
+
+def idempotent(view):
+    """Store the first response for an Idempotency-Key and replay it on retries.
+
+    Must be applied below ``jwt_required`` so keys are scoped to the caller.
+    The view must finish its write with ``commit()`` rather than
+    ``db.session.commit()``.
+    """
+
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        key = request.headers.get(HEADER)
+        if key is None:
+            return view(*args, **kwargs)
+        if not 1 <= len(key) <= 255:
+            return _error(f"{HEADER} must be 1-255 characters long", 400)
+
+        scope = (str(get_jwt_identity()), request.endpoint, key)
+        request_hash = sha256(request.get_data()).hexdigest()
+        now = datetime.now(timezone.utc)
+        ttl = timedelta(seconds=current_app.config.get("IDEMPOTENCY_TTL", 86400))
+        lease = timedelta(seconds=current_app.config.get("IDEMPOTENCY_LEASE", 60))
+
+        IdempotencyKey.query.filter(IdempotencyKey.created_at < now - ttl).delete(
+            synchronize_session=False
+        )
+        # The primary key makes this insert the lock: only one request per key
+        # gets to run the view, concurrent ones see the placeholder row. The
+        # placeholder's created_at is a lease: once it expires a retry may take
+        # the key over, and created_at is changed so the old request can no
+        # longer commit (see the fenced update below).
+        db.session.add(IdempotencyKey(
+            identity=scope[0],
+            endpoint=scope[1],
+            key=scope[2],
+            request_hash=request_hash,
+            created_at=now,
+        ))
+        try:
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            entry = db.session.get(IdempotencyKey, scope)
+            if entry is not None and entry.request_hash != request_hash:
+                return _error(f"{HEADER} was already used with a different request body", 422)
+            if entry is not None and entry.status is not None:
+                return _replay(entry)
+            if entry is None or not _take_over(scope, now, lease):
+                return _error("a request with this Idempotency-Key is in progress", 409, **{"Retry-After": "1"})
+
+        g.idempotency_pending = []
+        try:
+            response = make_response(view(*args, **kwargs))
+        except Exception:
+            _release(scope, now)
+            raise
+        finally:
+            pending = g.pop("idempotency_pending")
+
+        if response.status_code >= 500:
+            _release(scope, now)
+            return response
+
+        # Store the response in the same transaction as the view's write, and
+        # only if this request still holds the lease. If a retry took the key
+        # over, the write is rolled back instead of committed twice.
+        stored = db.session.execute(
+            update(IdempotencyKey)
+            .where(*_placeholder(scope, now))
+            .values(status=response.status_code, body=response.get_data(as_text=True))
+            .execution_options(synchronize_session=False)
+        )
+        if stored.rowcount != 1:
+            db.session.rollback()
+            return _error("a request with this Idempotency-Key is in progress", 409, **{"Retry-After": "1"})
+        db.session.commit()
+
+        for after in pending:
+            after()
+        return response
+
+    return wrapper
@@ -0,0 +1,189 @@
+import csv
+import io
+import math
+
+from marshmallow import ValidationError
+from marshmallow.utils import from_iso_datetime
+from sqlalchemy import text
+
+from .models import User, Category
+from .schemas import Record_Schema
+from .stats import stats_cache
+from . import db
+
+
+RECORD_FIELDS = ("user_id", "category_id", "datetime", "amount")
+
+STAGING_TABLE = "records_import"
+
+record_schema = Record_Schema()
+
+
+def _batches(reader, size):
+    batch = []
+    for line_no, row in enumerate(reader, start=2):
+        batch.append((line_no, row))
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _fast_load(row):
+    """Parse the common well-formed row without marshmallow, or return None.
+
+    The datetime goes through the same Z-suffix fix and ISO parser as
+    Record_Schema, so the fast path never accepts what the API rejects.
+    """
+    try:
+        amount = float(row["amount"])
+        dt = row["datetime"]
+        if dt.strip().endswith(("Z", "z")):
+            dt = dt.strip()[:-1] + "+00:00"
+        dt = from_iso_datetime(dt)
+        data = {
+            "user_id": int(row["user_id"]),
+            "category_id": int(row["category_id"]),
+            "datetime": dt,
+            "amount": amount,
+        }
+    except (AttributeError, TypeError, ValueError):
+        return None
+    if dt.tzinfo is None or not math.isfinite(amount) or amount < 0:
+        return None
+    return data
+
+
+def _validate_batch(batch):
+    loaded = []
+    rejected = []
+    for line_no, row in batch:
+        data = _fast_load(row)
+        if data is None:
+            # Anything the fast path does not accept goes through the schema,
+            # which either loads it or produces the error message.
+            try:
+                data = record_schema.load({k: row.get(k) for k in RECORD_FIELDS})
+            except ValidationError as e:
+                rejected.append((line_no, row, str(e.messages)))
+                continue
+        loaded.append((line_no, row, data))
+
+    if not loaded:
+        return [], rejected
+
+    user_ids = {d["user_id"] for _, _, d in loaded}
+    category_ids = {d["category_id"] for _, _, d in loaded}
+
+    known_users = {
+        uid for (uid,) in db.session.query(User.id).filter(User.id.in_(user_ids))
+    }
+    category_owner = dict(
+        db.session.query(Category.id, Category.owner_id).filter(Category.id.in_(category_ids))
+    )
+
+    valid = []
+    for line_no, row, data in loaded:
+        uid = data["user_id"]
+        cid = data["category_id"]
+        if uid not in known_users:
+            rejected.append((line_no, row, f"user_id {uid} not found"))
+        elif cid not in category_owner:
+            rejected.append((line_no, row, f"category_id {cid} not found"))
+        elif category_owner[cid] not in (None, uid):
+            rejected.append((line_no, row, "category is not visible for this user"))
+        else:
+            valid.append((line_no, row, data))
+    return valid, rejected
+
+
+def _copy_batch(rows):
+    db.session.execute(
+        text(
+            f"""
+        CREATE TEMP TABLE IF NOT EXISTS {STAGING_TABLE} (
+            line integer NOT NULL,
+            user_id integer NOT NULL,
+            category_id integer NOT NULL,
+            datetime timestamptz NOT NULL,
+            amount double precision NOT NULL
+        ) ON COMMIT DELETE ROWS
+    """
+        )
+    )
+
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    for line_no, _, r in rows:
+        writer.writerow(
+            (line_no, r["user_id"], r["category_id"], r["datetime"].isoformat(), r["amount"])
+        )
+    buf.seek(0)
+
+    cursor = db.session.connection().connection.cursor()
+    cursor.copy_expert(
+        f"COPY {STAGING_TABLE} (line, {', '.join(RECORD_FIELDS)}) FROM STDIN WITH (FORMAT csv)",
+        buf,
+    )
+    # Re-check visibility in the same statement so rows whose user or category
+    # disappeared after validation are skipped instead of aborting the batch,
+    # and hand the skipped lines back so they can be reported.
+    cursor.execute(
+        f"""
+        WITH checked AS (
+            SELECT s.*,
+                   CASE
+                       WHEN u.id IS NULL THEN 'user_id ' || s.user_id || ' not found'
+                       WHEN c.id IS NULL THEN 'category_id ' || s.category_id || ' not found'
+                       WHEN c.owner_id IS NOT NULL AND c.owner_id <> s.user_id
+                           THEN 'category is not visible for this user'
+                   END AS error
+            FROM {STAGING_TABLE} s
+            LEFT JOIN users u ON u.id = s.user_id
+            LEFT JOIN categories c ON c.id = s.category_id
+        ), inserted AS (
+            INSERT INTO records (user_id, category_id, datetime, amount)
+            SELECT user_id, category_id, datetime, amount
+            FROM checked
+            WHERE error IS NULL
+        )
+        SELECT line, error FROM checked WHERE error IS NOT NULL
+        """
+    )
+    skipped = dict(cursor.fetchall())
+    cursor.close()
+
+    dropped = [(line_no, row, skipped[line_no]) for line_no, row, _ in rows if line_no in skipped]
+    return len(rows) - len(dropped), dropped
+
+
+def run_import(source, errors, batch_size: int = 5000):
+    reader = csv.DictReader(source)
+    missing = [f for f in RECORD_FIELDS if f not in (reader.fieldnames or ())]
+    if missing:
+        raise ValueError(f"missing CSV columns: {', '.join(missing)}")
+
+    error_writer = csv.writer(errors)
+    error_writer.writerow(["line", *reader.fieldnames, "error"])
+
+    inserted = 0
+    rejected_count = 0
+    for batch in _batches(reader, batch_size):
+        valid, rejected = _validate_batch(batch)
+        if valid:
+            count, dropped = _copy_batch(valid)
+            inserted += count
+            rejected.extend(dropped)
+        db.session.commit()
+
+        if valid:
+            skipped = {line_no for line_no, _, _ in dropped}
+            for user_id in {data["user_id"] for line_no, _, data in valid if line_no not in skipped}:
+                stats_cache.invalidate(user_id)
+
+        for line_no, row, message in sorted(rejected, key=lambda r: r[0]):
+            error_writer.writerow([line_no, *(row.get(f) for f in reader.fieldnames), message])
+        rejected_count += len(rejected)
+
+    return inserted, rejected_count
@@ -0,0 +1,40 @@
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+
+class LocalStore:
+    """SQLite file shared by all gunicorn workers on this host."""
+
+    def __init__(self, path, schema):
+        self.path = path
+        self._local = threading.local()
+        self.connect().executescript(schema)
+
+    def connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=1, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=OFF")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def transaction(self):
+        conn = self.connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+
+def sqlite_path(storage):
+    """Return the file path of a "sqlite:///<path>" storage URL, or None."""
+    prefix = "sqlite:///"
+    if storage.startswith(prefix):
+        return storage[len(prefix):]
+    return None
@@ -11,6 +11,17 @@ class User(db.Model):
     records = db.relationship("Record", back_populates="user", cascade="all, delete-orphan")
     owner_of_category = db.relationship("Category", back_populates="owner", cascade="all, delete-orphan")
 
+    __table_args__ = (
+        db.UniqueConstraint("name", name="uq_users_name"),
+        db.Index("ix_users_name_id", "name", "id"),
+        db.Index(
+            "ix_users_name_trgm",
+            "name",
+            postgresql_using="gin",
+            postgresql_ops={"name": "gin_trgm_ops"},
+        ),
+    )
+
 
 class Category(db.Model):
     __tablename__ = "categories"
@@ -27,6 +38,13 @@ class Category(db.Model):
             unique=True,
             postgresql_where=text("owner_id IS NULL"),
         ),
+        db.Index("ix_categories_name_id", "name", "id"),
+        db.Index(
+            "ix_categories_name_trgm",
+            "name",
+            postgresql_using="gin",
+            postgresql_ops={"name": "gin_trgm_ops"},
+        ),
     )
 
 
@@ -55,3 +73,14 @@ class Record(db.Model):
         db.Index("ix_records_user_cat_dt", "user_id", "category_id", "datetime"),
         db.CheckConstraint("amount >= 0", name="ck_record_amount_nonnegative"),
     )
+
+
+class IdempotencyKey(db.Model):
+    __tablename__ = "idempotency_keys"
+    identity = db.Column(db.String(64), primary_key=True)
+    endpoint = db.Column(db.String(64), primary_key=True)
+    key = db.Column(db.String(255), primary_key=True)
+    request_hash = db.Column(db.String(64), nullable=False)
+    status = db.Column(db.Integer, nullable=True)
+    body = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime(timezone=True), nullable=False, index=True)
@@ -0,0 +1,199 @@
+import math
+import threading
+import time
+
+from flask import g, jsonify, request
+from flask_jwt_extended import get_jwt_identity, verify_jwt_in_request
+from flask_jwt_extended.exceptions import JWTExtendedException
+from jwt.exceptions import PyJWTError
+
+from .localstore import LocalStore, sqlite_path
+
+
+PERIODS = {
+    "second": 1,
+    "minute": 60,
+    "hour": 3600,
+}
+
+PURGE_INTERVAL = 60
+
+
+def parse_limit(value):
+    """Parse "N/period" into (tokens per second, burst size)."""
+    count, _, period = value.partition("/")
+    count = int(count)
+    seconds = PERIODS[period.strip().rstrip("s")]
+    return count / seconds, count
+
+
+def _refill(tokens, last, now, rate, burst):
+    """Return (allowed, tokens left, time the bucket is full again, retry after)."""
+    tokens = min(burst, tokens + (now - last) * rate)
+    allowed = tokens >= 1
+    if allowed:
+        tokens -= 1
+    full_at = now + (burst - tokens) / rate
+    return allowed, tokens, full_at, 0 if allowed else (1 - tokens) / rate
+
+
+class MemoryBackend:
+    """Token buckets and the in-flight counter kept in this process only."""
+
+    def __init__(self):
+        self._buckets = {}
+        self._inflight = 0
+        self._lock = threading.Lock()
+        self._purged = time.time()
+
+    def consume(self, key, rate, burst):
+        now = time.time()
+        with self._lock:
+            if now - self._purged > PURGE_INTERVAL:
+                # A bucket past its full_at would be full anyway, so dropping it is exact.
+                self._buckets = {k: v for k, v in self._buckets.items() if v[2] > now}
+                self._purged = now
+            tokens, last, _ = self._buckets.get(key, (burst, now, now))
+            allowed, tokens, full_at, retry_after = _refill(tokens, last, now, rate, burst)
+            self._buckets[key] = (tokens, now, full_at)
+        return allowed, retry_after
+
+    def acquire(self, limit, stale_after):
+        with self._lock:
+            if self._inflight >= limit:
+                return None
+            self._inflight += 1
+        return True
+
+    def release(self, token):
+        with self._lock:
+            self._inflight -= 1
+
+
+class SqliteBackend:
+    """Token buckets and in-flight requests in a local SQLite file.
+
+    Every gunicorn worker on the host opens the same file, so limits and the
+    concurrency cap apply to the whole server rather than to one process.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS token_buckets (
+            key TEXT PRIMARY KEY,
+            tokens REAL NOT NULL,
+            updated REAL NOT NULL,
+            full_at REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS ix_token_buckets_full_at ON token_buckets (full_at);
+        CREATE TABLE IF NOT EXISTS inflight (
+            id INTEGER PRIMARY KEY,
+            started REAL NOT NULL
+        );
+    """
+
+    def __init__(self, path):
+        self.store = LocalStore(path, self.SCHEMA)
+        self._purged = time.time()
+
+    def consume(self, key, rate, burst):
+        with self.store.transaction() as conn:
+            now = time.time()
+            if now - self._purged > PURGE_INTERVAL:
+                conn.execute("DELETE FROM token_buckets WHERE full_at < ?", (now,))
+                self._purged = now
+            row = conn.execute(
+                "SELECT tokens, updated FROM token_buckets WHERE key = ?", (key,)
+            ).fetchone()
+            tokens, last = row if row else (burst, now)
+            allowed, tokens, full_at, retry_after = _refill(tokens, last, now, rate, burst)
+            conn.execute(
+                "INSERT OR REPLACE INTO token_buckets (key, tokens, updated, full_at) "
+                "VALUES (?, ?, ?, ?)",
+                (key, tokens, now, full_at),
+            )
+        return allowed, retry_after
+
+    def acquire(self, limit, stale_after):
+        with self.store.transaction() as conn:
+            now = time.time()
+            # Rows left behind by a worker that was killed mid-request expire.
+            conn.execute("DELETE FROM inflight WHERE started < ?", (now - stale_after,))
+            (count,) = conn.execute("SELECT count(*) FROM inflight").fetchone()
+            if count >= limit:
+                return None
+            return conn.execute("INSERT INTO inflight (started) VALUES (?)", (now,)).lastrowid
+
+    def release(self, token):
+        self.store.connect().execute("DELETE FROM inflight WHERE id = ?", (token,))
+
+
+def _client_key():
+    try:
+        verify_jwt_in_request(optional=True)
+        identity = get_jwt_identity()
+    except (JWTExtendedException, PyJWTError):
+        identity = None
+    if identity is not None:
+        return f"user:{identity}"
+    return f"ip:{request.remote_addr}"
+
+
+def _reject(message, status, retry_after):
+    response = jsonify({"error": message})
+    response.status_code = status
+    response.headers["Retry-After"] = str(max(1, math.ceil(retry_after)))
+    return response
+
+
+class RateLimiter:
+    def __init__(self):
+        self.enabled = True
+        self.backend = None
+        self.limits = {}
+        self.exempt = set()
+        self.max_concurrent = 0
+        self.stale_after = 60
+
+    def init_app(self, app):
+        path = sqlite_path(app.config.get("RATELIMIT_STORAGE", "memory"))
+        self.backend = SqliteBackend(path) if path else MemoryBackend()
+
+        self.limits = {
+            endpoint: parse_limit(value)
+            for endpoint, value in app.config.get("RATE_LIMITS", {}).items()
+        }
+        self.exempt = set(app.config.get("CONCURRENCY_EXEMPT", ()))
+        self.max_concurrent = app.config.get("MAX_CONCURRENT_REQUESTS", 0)
+        self.stale_after = app.config.get("CONCURRENCY_STALE_AFTER", self.stale_after)
+
+        app.before_request(self._before_request)
+        app.teardown_request(self._teardown_request)
+
+    def _before_request(self):
+        if not self.enabled:
+            return None
+        if self.max_concurrent and request.endpoint not in self.exempt:
+            token = self.backend.acquire(self.max_concurrent, self.stale_after)
+            if token is None:
+                return _reject("server is busy, try again later", 503, 1)
+            g.rate_limit_slot = token
+
+        limit = self.limits.get(request.endpoint)
+        if limit is None:
+            return None
+
+        rate, burst = limit
+        allowed, retry_after = self.backend.consume(
+            f"{request.endpoint}:{_client_key()}", rate, burst
+        )
+        if not allowed:
+            return _reject("too many requests", 429, retry_after)
+        return None
+
+    def _teardown_request(self, exc):
+        token = g.pop("rate_limit_slot", None)
+        if token is not None:
+            self.backend.release(token)
+
+
+limiter = RateLimiter()
@@ -31,7 +31,7 @@ class Record_Schema(Schema):
     user_id = fields.Int(required=True)
     category_id = fields.Int(required=True)
     datetime = fields.AwareDateTime(required=True)
-    amount = fields.Float(required=True)
+    amount = fields.Float(required=True, validate=validate.Range(min=0))
 
     @pre_load
     def fix_z_suffix(self, data, **kwargs):
@@ -46,11 +46,27 @@ class CategoryDeleteSchema(Schema):
     user_id = fields.Int(allow_none=True, load_default=None)
 
 
-class CategoryQuerySchema(Schema):
+class ListQuerySchema(Schema):
+    format = fields.Str(load_default="rows", validate=validate.OneOf(["rows", "columnar"]))
+
+
+class SearchQuerySchema(ListQuerySchema):
+    q = fields.Str(validate=validate.Length(min=1, max=256))
+    match = fields.Str(load_default="prefix", validate=validate.OneOf(["prefix", "fuzzy"]))
+    limit = fields.Int(validate=validate.Range(min=1, max=100))
+    after = fields.Int()
+
+    @validates_schema
+    def after_needs_prefix(self, data, **kwargs):
+        if data.get("after") is not None and data["match"] == "fuzzy":
+            raise ValidationError("after is not supported with match=fuzzy")
+
+
+class CategoryQuerySchema(SearchQuerySchema):
     user_id = fields.Int(allow_none=True, load_default=None)
 
 
-class RecordQuerySchema(Schema):
+class RecordQuerySchema(ListQuerySchema):
     user_id = fields.Int(allow_none=True, load_default=None)
     category_id = fields.Int(allow_none=True, load_default=None)
 
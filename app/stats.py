@@ -0,0 +1,164 @@
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
+from sqlalchemy import func
+
+from . import db
+from .localstore import LocalStore, sqlite_path
+from .models import Category, Record
+
+
+TZ = ZoneInfo("Europe/Kyiv")
+
+
+ALL_USERS = 0
+
+
+class MemoryVersions:
+    """Invalidation counters seen by this process only."""
+
+    def __init__(self):
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        with self._lock:
+            return self._versions.get(ALL_USERS, 0), self._versions.get(user_id, 0)
+
+    def bump(self, user_id):
+        with self._lock:
+            self._versions[user_id] = self._versions.get(user_id, 0) + 1
+
+
+class SqliteVersions:
+    """Invalidation counters in a local SQLite file shared by all workers."""
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS stats_versions (
+            user_id INTEGER PRIMARY KEY,
+            version INTEGER NOT NULL
+        );
+    """
+
+    def __init__(self, path):
+        self.store = LocalStore(path, self.SCHEMA)
+
+    def get(self, user_id):
+        versions = dict(
+            self.store.connect().execute(
+                "SELECT user_id, version FROM stats_versions WHERE user_id IN (?, ?)",
+                (ALL_USERS, user_id),
+            )
+        )
+        return versions.get(ALL_USERS, 0), versions.get(user_id, 0)
+
+    def bump(self, user_id):
+        self.store.connect().execute(
+            "INSERT INTO stats_versions (user_id, version) VALUES (?, 1) "
+            "ON CONFLICT (user_id) DO UPDATE SET version = version + 1",
+            (user_id,),
+        )
+
+
+class StatsCache:
+    """Bounded per-process LRU of per-user stats.
+
+    Each entry remembers the user's invalidation version read before its query
+    ran. Writes bump that version, so an entry computed concurrently with a
+    write, or cached by another worker, is never served after the write. The
+    TTL is only a backstop for the in-memory version store.
+    """
+
+    def __init__(self):
+        self.maxsize = 1024
+        self.ttl = 30
+        self.versions = MemoryVersions()
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.maxsize = app.config.get("STATS_CACHE_SIZE", self.maxsize)
+        self.ttl = app.config.get("STATS_CACHE_TTL", self.ttl)
+        path = sqlite_path(app.config.get("STATS_CACHE_STORAGE", "memory"))
+        if path:
+            self.versions = SqliteVersions(path)
+
+    def get(self, user_id, month):
+        """Return (stats or None, version to pass to set() after a miss)."""
+        version = self.versions.get(user_id)
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None, version
+            entry_month, entry_version, stored_at, value = entry
+            if (
+                entry_month != month
+                or entry_version != version
+                or time.monotonic() - stored_at > self.ttl
+            ):
+                del self._entries[user_id]
+                return None, version
+            self._entries.move_to_end(user_id)
+            return value, version
+
+    def set(self, user_id, month, version, value):
+        with self._lock:
+            self._entries[user_id] = (month, version, time.monotonic(), value)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id):
+        self.versions.bump(user_id)
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        self.versions.bump(ALL_USERS)
+        with self._lock:
+            self._entries.clear()
+
+
+stats_cache = StatsCache()
+
+
+def month_start(now=None):
+    now = now or datetime.now(TZ)
+    return now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def next_month_start(since):
+    return (since + timedelta(days=32)).replace(day=1)
+
+
+def load_user_stats(user_id, since, top: int = 5):
+    rows = (
+        db.session.query(
+            Record.category_id,
+            Category.name,
+            func.sum(Record.amount),
+            func.count(Record.id),
+        )
+        .join(Category, Category.id == Record.category_id)
+        .filter(
+            Record.user_id == user_id,
+            Record.datetime >= since,
+            Record.datetime < next_month_start(since),
+        )
+        .group_by(Record.category_id, Category.name)
+        .order_by(func.sum(Record.amount).desc(), Record.category_id.asc())
+        .all()
+    )
+    return {
+        "user_id": user_id,
+        "month": since.strftime("%Y-%m"),
+        "total_spent": sum(total for _, _, total, _ in rows),
+        "record_count": sum(count for _, _, _, count in rows),
+        "top_categories": [
+            {"id": cid, "name": name, "amount": total, "count": count}
+            for cid, name, total, count in rows[:top]
+        ],
+    }
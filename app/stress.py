@@ -0,0 +1,169 @@
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+from flask import current_app
+from sqlalchemy import func
+
+from . import db
+from .models import User, Category, Record
+from .ratelimit import limiter
+
+
+def _run_phase(threads, calls):
+    """Run (method, path, json, headers, kind) calls concurrently.
+
+    Return per-kind status counters and requests per second.
+    """
+    app = current_app._get_current_object()
+
+    def call(spec):
+        method, path, payload, headers, kind = spec
+        try:
+            response = app.test_client().open(path, method=method, json=payload, headers=headers)
+        except Exception:
+            # PROPAGATE_EXCEPTIONS re-raises what would have been a 500.
+            return kind, 500
+        return kind, response.status_code
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        results = list(pool.map(call, calls))
+    elapsed = time.perf_counter() - started
+
+    statuses = {}
+    for kind, status in results:
+        statuses.setdefault(kind, Counter())[status] += 1
+    return statuses, len(calls) / elapsed
+
+
+def _check(failures, phase, statuses, expected):
+    for kind, want in expected.items():
+        got = dict(statuses.get(kind, {}))
+        if got != want:
+            failures.append(f"{phase}/{kind}: expected {want}, got {got}")
+
+
+def run_stress(threads: int = 8, rounds: int = 20, keep: bool = False):
+    """Hammer the write endpoints from many threads and verify the outcome.
+
+    Every name, category and record is contended by all threads at once, so
+    any check-then-insert race shows up as a duplicate row or a 500.
+    Return (report lines, failures).
+    """
+    prefix = f"stress-{uuid.uuid4().hex[:8]}"
+    report = []
+    failures = []
+    limiter_enabled, limiter.enabled = limiter.enabled, False
+
+    try:
+        client = current_app.test_client()
+        client.post("/user", json={"name": f"{prefix}-auth", "password": "stress-pass"})
+        token = client.post(
+            "/login", json={"name": f"{prefix}-auth", "password": "stress-pass"}
+        ).json["access_token"]
+        auth = {"Authorization": f"Bearer {token}"}
+        global_id = client.post("/category", json={"name": f"{prefix}-global"}, headers=auth).json["id"]
+        missing_id = (db.session.query(func.max(User.id)).scalar() or 0) + 1_000_000
+        db.session.rollback()
+
+        # Every thread registers every name: exactly one 201 per name.
+        names = [f"{prefix}-u{i}" for i in range(rounds)]
+        calls = [
+            ("POST", "/user", {"name": name, "password": "stress-pass"}, None, "register")
+            for name in names
+            for _ in range(threads)
+        ]
+        statuses, rate = _run_phase(threads, calls)
+        report.append(f"register      {len(calls):>6} calls {rate:>9.1f} req/s  {dict(statuses['register'])}")
+        _check(failures, "register", statuses, {
+            "register": {201: rounds, 409: rounds * (threads - 1)},
+        })
+
+        users = dict(
+            db.session.query(User.name, User.id).filter(User.name.in_(names)).all()
+        )
+        (user_rows,) = db.session.query(func.count(User.id)).filter(User.name.in_(names)).one()
+        db.session.rollback()
+        if user_rows != rounds or len(users) != rounds:
+            failures.append(f"register: expected {rounds} users, found {user_rows} rows")
+        owner_ids = [users[name] for name in names if name in users]
+
+        # Every thread creates the same personal category for every owner,
+        # plus one for an owner that does not exist.
+        calls = [
+            ("POST", "/category", {"name": f"{prefix}-c", "user_id": uid}, auth, "create")
+            for uid in owner_ids
+            for _ in range(threads)
+        ] + [
+            ("POST", "/category", {"name": f"{prefix}-c", "user_id": missing_id}, auth, "missing owner")
+            for _ in range(threads)
+        ]
+        statuses, rate = _run_phase(threads, calls)
+        report.append(f"add_category  {len(calls):>6} calls {rate:>9.1f} req/s  "
+                      f"{ {k: dict(v) for k, v in statuses.items()} }")
+        _check(failures, "add_category", statuses, {
+            "create": {201: len(owner_ids), 409: len(owner_ids) * (threads - 1)},
+            "missing owner": {404: threads},
+        })
+
+        categories = dict(
+            db.session.query(Category.owner_id, Category.id)
+            .filter(Category.owner_id.in_(owner_ids))
+            .all()
+        )
+        db.session.rollback()
+
+        when = datetime.now(timezone.utc).isoformat()
+        calls = []
+        for i, uid in enumerate(owner_ids):
+            other = owner_ids[(i + 1) % len(owner_ids)]
+            for _ in range(threads):
+                calls += [
+                    ("POST", "/record", {"user_id": uid, "category_id": categories[uid],
+                                         "datetime": when, "amount": 1}, auth, "own category"),
+                    ("POST", "/record", {"user_id": uid, "category_id": global_id,
+                                         "datetime": when, "amount": 1}, auth, "global category"),
+                    ("POST", "/record", {"user_id": other, "category_id": categories[uid],
+                                         "datetime": when, "amount": 1}, auth, "foreign category"),
+                    ("POST", "/record", {"user_id": missing_id, "category_id": global_id,
+                                         "datetime": when, "amount": 1}, auth, "missing user"),
+                    ("POST", "/record", {"user_id": uid, "category_id": missing_id,
+                                         "datetime": when, "amount": 1}, auth, "missing category"),
+                    ("POST", "/record", {"user_id": missing_id, "category_id": categories[uid],
+                                         "datetime": when, "amount": 1}, auth, "missing user, foreign category"),
+                ]
+        statuses, rate = _run_phase(threads, calls)
+        report.append(f"add_record    {len(calls):>6} calls {rate:>9.1f} req/s  "
+                      f"{ {k: dict(v) for k, v in statuses.items()} }")
+        per_kind = len(owner_ids) * threads
+        expected = {
+            "own category": {201: per_kind},
+            "global category": {201: per_kind},
+            "missing user": {404: per_kind},
+            "missing category": {404: per_kind},
+            "missing user, foreign category": {404: per_kind},
+        }
+        if len(owner_ids) > 1:
+            expected["foreign category"] = {400: per_kind}
+        _check(failures, "add_record", statuses, expected)
+
+        (record_rows,) = db.session.query(func.count(Record.id)).filter(
+            Record.user_id.in_(owner_ids)
+        ).one()
+        db.session.rollback()
+        created = sum(statuses[k][201] for k in statuses)
+        if record_rows != created:
+            failures.append(f"add_record: {created} records acknowledged, {record_rows} stored")
+    finally:
+        limiter.enabled = limiter_enabled
+        if not keep:
+            db.session.rollback()
+            for user in User.query.filter(User.name.like(f"{prefix}-%")).all():
+                db.session.delete(user)
+            Category.query.filter(Category.name == f"{prefix}-global").delete()
+            db.session.commit()
+
+    return report, failures
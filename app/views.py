@@ -1,14 +1,16 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, current_app, request, jsonify
 from marshmallow import ValidationError
 from zoneinfo import ZoneInfo
 from datetime import datetime
-from sqlalchemy import or_
+from sqlalchemy import func, insert, literal, or_, select, tuple_
 from sqlalchemy.exc import IntegrityError
 
 from passlib.hash import pbkdf2_sha256
 from flask_jwt_extended import create_access_token, jwt_required
 
 from . import db, schemas
+from .idempotency import idempotent, commit
+from .stats import stats_cache, load_user_stats, month_start
 from .models import User, Category, Record
 
 bp = Blueprint("api", __name__)
@@ -21,6 +23,7 @@ record_schema          = schemas.Record_Schema()
 records_schema         = schemas.Record_Schema(many=True)
 
 category_delete_schema = schemas.CategoryDeleteSchema()
+user_query_schema      = schemas.SearchQuerySchema()
 category_query_schema  = schemas.CategoryQuerySchema()
 record_query_schema    = schemas.RecordQuerySchema()
 user_id_path_schema    = schemas.UserIdPathSchema()
@@ -34,6 +37,63 @@ def err(message, status=400, **extra):
     return jsonify({"error": message, **extra}), status
 
 
+def is_foreign_key_violation(error):
+    # psycopg2 exposes the SQLSTATE; SQLite only has the message.
+    return getattr(error.orig, "pgcode", None) == "23503" or "FOREIGN KEY" in str(error.orig)
+
+
+def violated_constraint(error):
+    diag = getattr(error.orig, "diag", None)
+    return getattr(diag, "constraint_name", None) or ""
+
+
+def dump_list(schema, items, fmt):
+    data = schema.dump(items)
+    if fmt == "columnar":
+        return {name: [item[name] for item in data] for name in schema.dump_fields}
+    return data
+
+
+def is_search(args):
+    return any(args.get(k) is not None for k in ("q", "limit", "after"))
+
+
+def apply_search(query, model, args):
+    """Filter by name and page by (name, id) keyset.
+
+    On Postgres both prefix and fuzzy matching are served by the pg_trgm GIN
+    index on name; other databases fall back to plain LIKE. The (name, id)
+    btree index serves the ordering, so each page is an index range scan.
+    Raises ValidationError if ``after`` is not an existing id.
+    """
+    text_ = args.get("q")
+    limit = args.get("limit", 20)
+    pattern = None
+    if text_ is not None:
+        pattern = text_.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+    if text_ is not None and args["match"] == "fuzzy":
+        if db.engine.dialect.name == "postgresql":
+            return query.filter(model.name.op("%")(text_)).order_by(
+                func.similarity(model.name, text_).desc(), model.id.asc()
+            ).limit(limit)
+        return query.filter(model.name.ilike(f"%{pattern}%", escape="\\")).order_by(
+            model.name.asc(), model.id.asc()
+        ).limit(limit)
+
+    if pattern is not None:
+        query = query.filter(model.name.ilike(f"{pattern}%", escape="\\"))
+
+    after = args.get("after")
+    if after is not None:
+        last_name = db.session.query(model.name).filter(model.id == after).scalar()
+        if last_name is None:
+            raise ValidationError({"after": [f"unknown cursor {after}"]})
+        query = query.filter(tuple_(model.name, model.id) > tuple_(last_name, after))
+
+    return query.order_by(model.name.asc(), model.id.asc()).limit(limit)
+
+
 @bp.route("/")
 def hello_world():
     return "<p>Hello, it's me amogus!</p>", 200
@@ -56,13 +116,19 @@ def register_user():
     except ValidationError as e:
         return err("invalid user data", 400, details=e.messages)
 
-    if User.query.filter_by(name=data["name"]).first():
+    stmt = (
+        insert(User)
+        .values(name=data["name"], password=pbkdf2_sha256.hash(data["password"]))
+        .returning(User.id)
+    )
+    try:
+        user_id = db.session.execute(stmt).scalar_one()
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
         return err("user with this name already exists", 409)
 
-    user = User(name=data["name"], password=pbkdf2_sha256.hash(data["password"]))
-    db.session.add(user)
-    db.session.commit()
-    return jsonify({"id": user.id, "name": user.name}), 201
+    return jsonify({"id": user_id, "name": data["name"]}), 201
 
 
 @bp.post("/login")
@@ -91,12 +157,37 @@ def get_user(user_id: int):
     return jsonify(user_schema.dump({"id": user_id, "name": user.name})), 200
 
 
+@bp.get("/user/<int:user_id>/stats")
+@jwt_required()
+def get_user_stats(user_id: int):
+    since = month_start()
+    month = since.strftime("%Y-%m")
+    stats, version = stats_cache.get(user_id, month)
+    if stats is None:
+        stats = load_user_stats(user_id, since, top=current_app.config.get("STATS_TOP_CATEGORIES", 5))
+        if stats["record_count"] == 0 and User.query.get(user_id) is None:
+            return err("user not found", 404)
+        stats_cache.set(user_id, month, version, stats)
+    return jsonify(stats), 200
+
+
 @bp.get("/users")
 @jwt_required()
 def get_users():
-    users = User.query.order_by(User.id.asc()).all()
+    try:
+        args = user_query_schema.load(request.args)
+    except ValidationError as e:
+        return err("invalid query", 400, details=e.messages)
+
+    if is_search(args):
+        try:
+            users = apply_search(User.query, User, args).all()
+        except ValidationError as e:
+            return err("invalid query", 400, details=e.messages)
+    else:
+        users = User.query.order_by(User.id.asc()).all()
     items = [{"id": u.id, "name": u.name} for u in users]
-    return jsonify(users_schema.dump(items)), 200
+    return jsonify(dump_list(users_schema, items, args["format"])), 200
 
 
 @bp.delete("/user/<int:user_id>")
@@ -114,6 +205,7 @@ def kill_user(user_id: int):
     name = user.name
     db.session.delete(user)
     db.session.commit()
+    stats_cache.invalidate(args["user_id"])
     return jsonify({"result": f"id: {user_id} successfully deleted", "name": name}), 200
 
 
@@ -133,13 +225,20 @@ def get_categories():
             or_(Category.owner_id.is_(None), Category.owner_id == uid)
         )
 
-    categories = q.order_by(Category.owner_id.isnot(None), Category.name.asc()).all()
+    if is_search(args):
+        try:
+            categories = apply_search(q, Category, args).all()
+        except ValidationError as e:
+            return err("invalid query", 400, details=e.messages)
+    else:
+        categories = q.order_by(Category.owner_id.isnot(None), Category.name.asc()).all()
     items = [{"id": c.id, "name": c.name, "owner_id": c.owner_id} for c in categories]
-    return jsonify(categories_schema.dump(items)), 200
+    return jsonify(dump_list(categories_schema, items, args["format"])), 200
 
 
 @bp.post("/category")
 @jwt_required()
+@idempotent
 def add_category():
     if not request.is_json:
         return err("Content-Type must be application/json", 415)
@@ -149,20 +248,24 @@ def add_category():
         return err("invalid category data", 400, details=e.messages)
 
     owner_id = data.get("user_id")
-    if owner_id is not None and User.query.get(owner_id) is None:
-        return err(f"user_id {owner_id} not found", 404)
 
-    category = Category(name=data["name"], owner_id=owner_id)
-    db.session.add(category)
+    stmt = (
+        insert(Category)
+        .values(name=data["name"], owner_id=owner_id)
+        .returning(Category.id)
+    )
     try:
-        db.session.commit()
-    except IntegrityError:
+        category_id = db.session.execute(stmt).scalar_one()
+        commit()
+    except IntegrityError as e:
         db.session.rollback()
+        if is_foreign_key_violation(e):
+            return err(f"user_id {owner_id} not found", 404)
         return err("category with this name already exists in scope", 409)
 
     return jsonify(category_schema.dump({
-        "id": category.id,
-        "name": category.name,
+        "id": category_id,
+        "name": data["name"],
         "owner_id": owner_id
     })), 201
 
@@ -189,6 +292,7 @@ def kill_category():
             name = category.name
             db.session.delete(category)
             db.session.commit()
+            stats_cache.clear()
             return jsonify({"result": f"id: {cid} successfully deleted", "name": name}), 200
         return err("user_id is required to delete personal category", 400)
 
@@ -201,6 +305,7 @@ def kill_category():
     name = category.name
     db.session.delete(category)
     db.session.commit()
+    stats_cache.invalidate(uid)
     return jsonify({"result": f"id: {cid} successfully deleted", "name": name}), 200
 
 
@@ -222,6 +327,7 @@ def get_record(record_id: int):
 
 @bp.post("/record")
 @jwt_required()
+@idempotent
 def add_record_data():
     if not request.is_json:
         return err("Content-Type must be application/json", 415)
@@ -233,25 +339,44 @@ def add_record_data():
     user_id = data["user_id"]
     category_id = data["category_id"]
 
-    if User.query.get(user_id) is None:
-        return err(f"user_id {user_id} not found", 404)
-
-    category = Category.query.get(category_id)
-    if category is None:
-        return err(f"category_id {category_id} not found", 404)
+    # The visibility rule is part of the INSERT ... SELECT and the users FK
+    # catches unknown users, so the happy path is a single statement.
+    stmt = (
+        insert(Record)
+        .from_select(
+            ["user_id", "category_id", "datetime", "amount"],
+            select(
+                literal(user_id, Record.user_id.type),
+                Category.id,
+                literal(data["datetime"], Record.datetime.type),
+                literal(data["amount"], Record.amount.type),
+            ).where(
+                Category.id == category_id,
+                or_(Category.owner_id.is_(None), Category.owner_id == user_id),
+            ),
+        )
+        .returning(Record.id, Record.datetime, Record.amount)
+    )
+    try:
+        record = db.session.execute(stmt).first()
+        commit(after=lambda: stats_cache.invalidate(user_id))
+    except IntegrityError as e:
+        db.session.rollback()
+        if is_foreign_key_violation(e):
+            # The category can also vanish between the SELECT and the FK check.
+            if violated_constraint(e) == "records_category_id_fkey":
+                return err(f"category_id {category_id} not found", 404)
+            return err(f"user_id {user_id} not found", 404)
+        raise
 
-    if not (category.owner_id is None or category.owner_id == user_id):
+    if record is None:
+        # Nothing was inserted, so the users FK never ran: check it here.
+        if User.query.get(user_id) is None:
+            return err(f"user_id {user_id} not found", 404)
+        if Category.query.get(category_id) is None:
+            return err(f"category_id {category_id} not found", 404)
         return err("category is not visible for this user", 400)
 
-    record = Record(
-        user_id=user_id,
-        category_id=category_id,
-        datetime=data["datetime"],
-        amount=data["amount"],
-    )
-    db.session.add(record)
-    db.session.commit()
-
     return jsonify(record_schema.dump({
         "id": record.id,
         "user_id": user_id,
@@ -282,6 +407,7 @@ def kill_record(record_id: int):
 
     db.session.delete(record)
     db.session.commit()
+    stats_cache.invalidate(rec["user_id"])
 
     return jsonify({
         "result": f"id: {record_id} successfully deleted",
@@ -315,4 +441,4 @@ def find_record_data():
         "amount": r.amount,
     } for r in rows]
 
-    return jsonify({"items": records_schema.dump(items), "count": len(items)}), 200
+    return jsonify({"items": dump_list(records_schema, items, args["format"]), "count": len(items)}), 200
@@ -19,4 +19,4 @@ if [ "${RUN_SEED:-0}" = "1" ]; then
 fi
 
 
-exec gunicorn -w 2 -k gthread -b 0.0.0.0:${PORT:-6060} app:app
\ No newline at end of file
+exec gunicorn -w 2 -k gthread --threads ${GUNICORN_THREADS:-8} -b 0.0.0.0:${PORT:-6060} app:app
\ No newline at end of file
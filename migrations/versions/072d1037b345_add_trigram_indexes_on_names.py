@@ -0,0 +1,39 @@
+"""add trigram indexes on user and category names
+
+Revision ID: 072d1037b345
+Revises: f41ae0b9688f
+Create Date: 2026-10-19 16:20:33.904127
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '072d1037b345'
+down_revision = 'f41ae0b9688f'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.create_index('ix_users_name_trgm', ['name'], unique=False, postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'})
+
+    with op.batch_alter_table('categories', schema=None) as batch_op:
+        batch_op.create_index('ix_categories_name_trgm', ['name'], unique=False, postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'})
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+
+    with op.batch_alter_table('categories', schema=None) as batch_op:
+        batch_op.drop_index('ix_categories_name_trgm', postgresql_using='gin')
+
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.drop_index('ix_users_name_trgm', postgresql_using='gin')